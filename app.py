@@ -1,7 +1,11 @@
 import os
 import time
+import atexit
 import threading
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request, render_template, request, redirect, url_for, session, flash, jsonify, g
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
@@ -11,9 +15,32 @@ import json
 from PIL import Image
 import pytesseract
 import re
-from functools import wraps
+import csv
+import io
+import hashlib
+import uuid
+from functools import wraps, lru_cache
+from collections import namedtuple, OrderedDict
+
+# Optional in-process Tesseract bindings; fall back to the pytesseract CLI wrapper without them
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Optional OpenCV receipt preprocessing; falls back to plain PIL grayscale + resize
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+class FinSightRequest(Request):
+    # Cap non-file form fields held in memory; Werkzeug already spools uploads over 500KB to disk
+    max_form_memory_size = 512 * 1024
 
 app = Flask(__name__)
+app.request_class = FinSightRequest
 app.config['SECRET_KEY'] = 'expense_management_secret_key_2024'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-size
@@ -21,11 +48,24 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-size
 # Database configuration
 DATABASE = 'database/expense_management.db'
 
+# Password hashing (scrypt is memory-hard and cheaper in CPU than high-iteration pbkdf2)
+PASSWORD_HASH_METHOD = 'scrypt'
+# Checked against when a login email is unknown, so misses cost the same as wrong passwords.
+# Only scrypt hashes match its timing; older pbkdf2 hashes are rehashed at their next login.
+_DUMMY_PASSWORD_HASH = generate_password_hash('not-a-real-password', method=PASSWORD_HASH_METHOD)
+
+# Receipt OCR patterns
+_AMOUNT_RE = re.compile(r'[\$€£¥₹]?(\d+\.?\d*)')
+_DATE_RE = re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')
+
 def init_db():
     """Initialize the database with all required tables"""
     conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
 
+    # Larger pages suit the row sizes here; only takes effect on a brand new database
+    cursor.execute('PRAGMA page_size=8192;')
+
     # Create companies table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS companies (
@@ -70,6 +110,7 @@ def init_db():
             status TEXT CHECK (status IN ('pending','approved','rejected','processing')) DEFAULT 'pending',
             receipt_url TEXT,
             receipt_data TEXT,
+            ocr_claimed_at REAL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(user_id),
             FOREIGN KEY (company_id) REFERENCES companies(company_id)
@@ -136,12 +177,46 @@ def init_db():
         )
     """)
 
+    # Databases created before background OCR lack the column recording which receipt OCR is claimed
+    claim_columns = {row[1] for row in cursor.execute('PRAGMA table_info(expense_claims)')}
+    if 'ocr_claimed_at' not in claim_columns:
+        cursor.execute('ALTER TABLE expense_claims ADD COLUMN ocr_claimed_at REAL')
+
+    # Create ocr_jobs table (receipt previews in flight, visible to every worker process)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_jobs (
+            job_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            result TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+
+    # Create indexes for the hot lookup patterns
+    # (users.email is already indexed by its UNIQUE constraint)
+    # Databases built from database_schema.sql name some columns differently (approvals.status,
+    # audit_log.created_at) and carry their own indexes, so skip any whose columns are missing
+    for index_name, table, columns in (
+        ('idx_users_company_role', 'users', ('company_id', 'role_type', 'is_active')),
+        ('idx_claims_user_created', 'expense_claims', ('user_id', 'created_at DESC')),
+        ('idx_claims_company_status', 'expense_claims', ('company_id', 'status')),
+        ('idx_approvals_approver_decision', 'approvals', ('approver_id', 'decision')),
+        ('idx_approvals_claim_decision', 'approvals', ('claim_id', 'decision')),
+        ('idx_audit_user_time', 'audit_log', ('user_id', 'timestamp DESC')),
+    ):
+        table_columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        if all(column.split()[0] in table_columns for column in columns):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({', '.join(columns)})")
+
     conn.commit()
 
     
     # Setup default approval sequences
     setup_default_approval_sequences()
 
+    # Start writing audit entries in the background
+    start_audit_writer()
+
 def setup_default_approval_sequences():
     """Setup default approval sequences for companies that don't have any"""
     conn = get_db_connection()
@@ -159,40 +234,24 @@ def setup_default_approval_sequences():
         
         if existing_sequences['count'] == 0:
             # No sequences exist, create default ones
-            # Get all admins in the company (excluding the first admin who might be submitting)
-            admins = conn.execute("""
-                SELECT user_id FROM users 
-                WHERE company_id = ? AND role_type = 'admin' AND is_active = 1
-                ORDER BY user_id
-            """, (company_id,)).fetchall()
-            
-            # Get all managers in the company
-            managers = conn.execute("""
-                SELECT user_id FROM users 
-                WHERE company_id = ? AND role_type = 'manager' AND is_active = 1
-                ORDER BY user_id
+            # Get all managers then all admins in the company in one query
+            approvers = conn.execute("""
+                SELECT user_id, role_type FROM users 
+                WHERE company_id = ? AND is_active = 1 AND role_type IN ('admin', 'manager')
+                ORDER BY CASE role_type WHEN 'manager' THEN 0 ELSE 1 END, user_id
             """, (company_id,)).fetchall()
             
-            sequence_order = 1
-            
-            # Add managers first
-            for manager in managers:
-                conn.execute("""
-                    INSERT INTO approval_sequences (company_id, user_id, sequence_order, is_manager_approver)
-                    VALUES (?, ?, ?, 1)
-                """, (company_id, manager['user_id'], sequence_order))
-                sequence_order += 1
-            
-            # Add admins after managers
-            for admin in admins:
-                conn.execute("""
-                    INSERT INTO approval_sequences (company_id, user_id, sequence_order, is_manager_approver)
-                    VALUES (?, ?, ?, 0)
-                """, (company_id, admin['user_id'], sequence_order))
-                sequence_order += 1
+            # Managers first, admins after managers
+            rows = [(company_id, approver['user_id'], sequence_order, 1 if approver['role_type'] == 'manager' else 0)
+                    for sequence_order, approver in enumerate(approvers, 1)]
+            conn.executemany("""
+                INSERT INTO approval_sequences (company_id, user_id, sequence_order, is_manager_approver)
+                VALUES (?, ?, ?, ?)
+            """, rows)
     
     conn.commit()
-    conn.close()
+    db_manager.close_connection()
+    get_company_sequences.cache_clear()
 
 # Thread-local storage for database connections
 thread_local = threading.local()
@@ -200,43 +259,124 @@ thread_local = threading.local()
 import threading
 from contextlib import contextmanager
 
+# Row classes keyed by result column names, shared across queries with the same shape
+_row_classes = {}
+
+def namedtuple_factory(cursor, row):
+    """Row factory returning namedtuples (attribute access, no per-row name lookup)"""
+    columns = tuple(column[0] for column in cursor.description)
+    row_class = _row_classes.get(columns)
+    if row_class is None:
+        row_class = _row_classes.setdefault(columns, namedtuple('Row', columns, rename=True))
+    return row_class(*row)
+
 # Thread-safe database connection manager
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pool_size=8):
         self.db_path = db_path
         self.local = threading.local()
-        self._lock = threading.RLock()
+        # Idle connections kept open across requests (LIFO reuses the connection with the warmest cache)
+        self._writers = queue.LifoQueue(maxsize=pool_size)
+        self._readers = queue.LifoQueue(maxsize=pool_size)
+    
+    def _open_writer(self):
+        """Open a read-write connection with PRAGMAs applied once"""
+        conn = sqlite3.connect(
+            self.db_path, 
+            timeout=30.0,  # kept under the gunicorn worker timeout
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        # Optimize for concurrency
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        conn.execute('PRAGMA cache_size=-65536;')  # 64 MB
+        conn.execute('PRAGMA mmap_size=268435456;')  # 256 MB
+        conn.execute('PRAGMA temp_store=memory;')
+        conn.execute('PRAGMA busy_timeout=30000;')
+        conn.execute('PRAGMA wal_autocheckpoint=1000;')
+        conn.execute('PRAGMA foreign_keys=ON;')
+        return conn
+    
+    def _open_reader(self):
+        """Open a read-only connection with PRAGMAs applied once"""
+        # Read-only handles never take the write lock, so they don't contend with writers under WAL
+        conn = sqlite3.connect(
+            f'file:{self.db_path}?mode=ro',
+            uri=True,
+            timeout=30.0,
+            check_same_thread=False
+        )
+        conn.row_factory = namedtuple_factory
+        conn.execute('PRAGMA cache_size=-65536;')  # 64 MB
+        conn.execute('PRAGMA mmap_size=268435456;')  # 256 MB
+        conn.execute('PRAGMA temp_store=memory;')
+        conn.execute('PRAGMA busy_timeout=30000;')
+        return conn
+    
+    @staticmethod
+    def _checkout(pool, open_connection):
+        """Take an idle pooled connection, or open a new one"""
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            return open_connection()
+    
+    @staticmethod
+    def _release(pool, conn):
+        """Return a connection to its pool, closing it if the pool is full"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
     
     def get_connection(self):
         """Get thread-local database connection"""
-        if not hasattr(self.local, 'connection') or self.local.connection is None:
-            with self._lock:
-                self.local.connection = sqlite3.connect(
-                    self.db_path, 
-                    timeout=120.0,
-                    check_same_thread=False
-                )
-                self.local.connection.row_factory = sqlite3.Row
-                # Optimize for concurrency
-                self.local.connection.execute('PRAGMA journal_mode=WAL;')
-                self.local.connection.execute('PRAGMA synchronous=NORMAL;')
-                self.local.connection.execute('PRAGMA cache_size=2000;')
-                self.local.connection.execute('PRAGMA temp_store=memory;')
-                self.local.connection.execute('PRAGMA busy_timeout=120000;')
-                self.local.connection.execute('PRAGMA wal_autocheckpoint=1000;')
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = self._checkout(self._writers, self._open_writer)
         return self.local.connection
     
+    def get_reader(self):
+        """Get thread-local read-only database connection"""
+        if getattr(self.local, 'reader', None) is None:
+            self.local.reader = self._checkout(self._readers, self._open_reader)
+        return self.local.reader
+    
     def close_connection(self):
-        """Close thread-local connection"""
-        if hasattr(self.local, 'connection') and self.local.connection:
-            self.local.connection.close()
+        """Return thread-local connections to the pool"""
+        if getattr(self.local, 'connection', None) is not None:
+            self._release(self._writers, self.local.connection)
             self.local.connection = None
+        if getattr(self.local, 'reader', None) is not None:
+            self._release(self._readers, self.local.reader)
+            self.local.reader = None
+    
+    def close_all(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                conn = self._writers.get_nowait()
+            except queue.Empty:
+                break
+            # Keep query planner statistics fresh (cheap, usually a no-op)
+            conn.execute('PRAGMA optimize;')
+            conn.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
 
 # Initialize database manager
 db_manager = DatabaseManager(DATABASE)
+atexit.register(db_manager.close_all)
 
-def get_db():
+def get_db(readonly=False):
     """Get database connection - simplified version"""
+    if readonly:
+        return db_manager.get_reader()
     return db_manager.get_connection()
 
 def get_db_connection():
@@ -245,29 +385,25 @@ def get_db_connection():
 
 @contextmanager
 def database_transaction():
-    """Context manager for database transactions with retry logic"""
-    max_retries = 5
-    for attempt in range(max_retries):
-        conn = None
-        try:
-            conn = db_manager.get_connection()
-            yield conn
-            conn.commit()
-            break
-        except sqlite3.OperationalError as e:
-            if conn:
-                conn.rollback()
-            if "database is locked" in str(e) and attempt < max_retries - 1:
-                time.sleep(0.2 * (2 ** attempt))  # Exponential backoff
-                continue
-            raise
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise
+    """Context manager for database transactions (waits up to busy_timeout for the write lock)"""
+    conn = db_manager.get_connection()
+    if conn.in_transaction:
+        # Nested use joins the transaction already open on this connection
+        yield conn
+        return
+
+    # Take the write lock up front; while another writer holds it, SQLite's busy handler
+    # retries with its own short backoff for up to busy_timeout before raising "database is locked"
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
 def execute_db_operation(operation_func, *args, **kwargs):
-    """Execute database operation with automatic retry and connection management"""
+    """Execute database operation in one write transaction (waits up to busy_timeout, then raises)"""
     with database_transaction() as conn:
         return operation_func(conn, *args, **kwargs)
             
@@ -294,7 +430,7 @@ def admin_required(f):
 # Flask teardown handler
 @app.teardown_appcontext
 def close_db_connection(error):
-    """Close database connection when app context tears down"""
+    """Return database connections to the pool when app context tears down"""
     db_manager.close_connection()
 
 if __name__ == '__main__':
@@ -302,27 +438,70 @@ if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
 
 # Utility functions
+
+# External API caches (currency rates refresh hourly, country list is kept for the process lifetime)
+RATES_CACHE_TTL = 3600
+EXTERNAL_API_TIMEOUT = 3
+_rates_cache = {}  # base_currency -> (fetched_at, rates)
+_rates_lock = threading.Lock()
+_countries_cache = None
+
 def get_currency_rates(base_currency='USD'):
-    """Get currency conversion rates"""
+    """Get currency conversion rates (cached per base currency)"""
+    with _rates_lock:
+        cached = _rates_cache.get(base_currency)
+    if cached and time.time() - cached[0] < RATES_CACHE_TTL:
+        return cached[1]
+
     try:
-        response = requests.get(f'https://api.exchangerate-api.com/v4/latest/{base_currency}')
+        response = requests.get(f'https://api.exchangerate-api.com/v4/latest/{base_currency}',
+                                timeout=EXTERNAL_API_TIMEOUT)
         if response.status_code == 200:
-            return response.json()['rates']
+            rates = response.json()['rates']
+            with _rates_lock:
+                _rates_cache[base_currency] = (time.time(), rates)
+            return rates
     except:
         pass
-    return {}
+
+    # Serve stale rates rather than none if the upstream is unavailable
+    return cached[1] if cached else {}
 
 def get_countries_currencies():
-    """Get list of countries and their currencies"""
+    """Get list of countries and their currencies (cached after first successful call)"""
+    global _countries_cache
+    if _countries_cache is not None:
+        return _countries_cache
+
     try:
-        response = requests.get('https://restcountries.com/v3.1/all?fields=name,currencies')
+        response = requests.get('https://restcountries.com/v3.1/all?fields=name,currencies',
+                                timeout=EXTERNAL_API_TIMEOUT)
         if response.status_code == 200:
-            return response.json()
+            _countries_cache = response.json()
+            return _countries_cache
         else:
             return []
     except:
         return []
 
+_country_currency_cache = None
+
+def get_country_currency_map():
+    """Get {country name: base currency} built once from the cached country list"""
+    global _country_currency_cache
+    if _country_currency_cache is not None:
+        return _country_currency_cache
+
+    countries = get_countries_currencies()
+    currency_map = {
+        country['name']['common']: next(iter(country.get('currencies') or {}), 'USD')
+        for country in countries if country.get('name', {}).get('common')
+    }
+    # Only keep a map built from a successful fetch
+    if countries:
+        _country_currency_cache = currency_map
+    return currency_map
+
 def convert_currency(amount, from_currency, to_currency):
     """Convert currency amount"""
     if from_currency == to_currency:
@@ -333,61 +512,416 @@ def convert_currency(amount, from_currency, to_currency):
         return round(amount * rates[to_currency], 2)
     return amount
 
+def _parse_receipt_text(text):
+    """Extract amount, date and description from OCR text"""
+    # Extract information using regex patterns
+    amounts = _AMOUNT_RE.findall(text)
+    dates = _DATE_RE.findall(text)
+
+    # Find the largest amount (likely the total)
+    total_amount = max((float(amt) for amt in amounts if amt), default=0)
+
+    # Get first date found
+    expense_date = datetime.now().strftime('%Y-%m-%d')
+    if dates:
+        try:
+            # Try to parse the date
+            date_str = dates[0]
+            if '/' in date_str:
+                expense_date = datetime.strptime(date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
+            elif '-' in date_str:
+                expense_date = datetime.strptime(date_str, '%m-%d-%Y').strftime('%Y-%m-%d')
+        except:
+            pass
+
+    return {
+        'amount': total_amount,
+        'date': expense_date,
+        'description': text[:200],  # First 200 chars as description
+        'raw_text': text
+    }
+
+OCR_FAILED_DESCRIPTION = 'OCR processing failed'
+
+def _ocr_failure(error):
+    """OCR result returned when a receipt could not be processed"""
+    return {
+        'amount': 0,
+        'date': datetime.now().strftime('%Y-%m-%d'),
+        'description': OCR_FAILED_DESCRIPTION,
+        'raw_text': str(error)
+    }
+
+# Receipts are scaled down so their longest side is at most this many pixels before OCR
+OCR_MAX_DIMENSION = 1600
+
+def _preprocess_receipt(image_path):
+    """Grayscale, downscale and binarize a receipt image (path or binary file) to cut OCR work"""
+    image = Image.open(image_path)
+    if cv2 is None:
+        image = image.convert('L')
+        image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+        return image
+
+    gray = cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+    scale = OCR_MAX_DIMENSION / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 31, 10)
+
+# Thread-local tesserocr API (the language model is loaded once per thread)
+_tess_local = threading.local()
+
+def _get_tess_api():
+    """Get this thread's tesserocr API instance"""
+    api = getattr(_tess_local, 'api', None)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang='eng')
+        _tess_local.api = api
+    return api
+
 def ocr_receipt(image_path):
-    """Extract text from receipt using OCR"""
+    """Extract text from receipt (file path or binary file object) using OCR"""
     try:
-        # Open image and extract text
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image)
+        # Open and preprocess image, then extract text
+        image = _preprocess_receipt(image_path)
+        if tesserocr is not None:
+            api = _get_tess_api()
+            api.SetImage(image if isinstance(image, Image.Image) else Image.fromarray(image))
+            text = api.GetUTF8Text()
+        else:
+            text = pytesseract.image_to_string(image)
+        return _parse_receipt_text(text)
+    except Exception as e:
+        return _ocr_failure(e)
 
-        # Extract information using regex patterns
-        amount_pattern = r'[\$€£¥₹]?(\d+\.?\d*)'
-        date_pattern = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
+def ocr_receipts_batch(paths):
+    """Extract text from several receipts with a single tesseract run"""
+    # tesserocr has no process startup to amortize, so just reuse the loaded API
+    if len(paths) == 1 or tesserocr is not None:
+        return [ocr_receipt(path) for path in paths]
 
-        amounts = re.findall(amount_pattern, text)
-        dates = re.findall(date_pattern, text)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Preprocessed copies are small binarized PNGs, cheap to write and fast to recognize
+            image_paths = []
+            for index, path in enumerate(paths):
+                image = _preprocess_receipt(path)
+                if not isinstance(image, Image.Image):
+                    image = Image.fromarray(image)
+                image_path = os.path.join(tmp_dir, f'{index}.png')
+                image.save(image_path)
+                image_paths.append(image_path)
+
+            # Tesseract treats a .txt input as a list of images and separates pages with form feeds
+            list_path = os.path.join(tmp_dir, 'images.txt')
+            with open(list_path, 'w') as f:
+                f.write('\n'.join(image_paths))
+            text = pytesseract.image_to_string(list_path)
+
+        pages = text.split('\f')
+        if len(pages) >= len(paths):
+            return [_parse_receipt_text(page) for page in pages[:len(paths)]]
+    except Exception:
+        pass
 
-        # Find the largest amount (likely the total)
-        total_amount = 0
-        if amounts:
-            total_amount = max([float(amt) for amt in amounts if amt])
+    # Page count didn't line up with the inputs (bad or multi-page images) - OCR one by one
+    return [ocr_receipt(path) for path in paths]
+
+_UPLOAD_DIR = app.config['UPLOAD_FOLDER']
+
+def upload_destination(original_filename):
+    """Build the timestamped stored filename and its path for an uploaded file"""
+    filename = f"{time.strftime('%Y%m%d_%H%M%S')}_{secure_filename(original_filename)}"
+    return filename, f"{_UPLOAD_DIR}/{filename}"
+
+# Receipt uploads are copied in large blocks to cut read/write syscalls
+UPLOAD_BUFFER_SIZE = 1 << 20  # 1 MiB
+# Uploads up to this size are also kept in memory so OCR doesn't re-read them from disk
+OCR_IN_MEMORY_LIMIT = 4 * 1024 * 1024
+
+def save_upload(file, file_path, keep_contents=False):
+    """Stream an uploaded file to disk, returning (SHA-256 hex digest, contents)
+
+    With keep_contents, contents holds the file's bytes when it is at most OCR_IN_MEMORY_LIMIT;
+    otherwise it is None.
+    """
+    digest = hashlib.sha256()
+    chunks = [] if keep_contents else None
+    size = 0
+    with open(file_path, 'wb', buffering=UPLOAD_BUFFER_SIZE) as out:
+        while True:
+            chunk = file.stream.read(UPLOAD_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+            if chunks is not None and size <= OCR_IN_MEMORY_LIMIT:
+                chunks.append(chunk)
+            else:
+                chunks = None
+    return digest.hexdigest(), b''.join(chunks) if chunks is not None else None
+
+# OCR results of recent uploads keyed by content digest, so identical receipts are only read once
+OCR_CACHE_SIZE = 256
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+def get_cached_ocr(digest):
+    """Get the cached OCR result for an upload digest, or None"""
+    with _ocr_cache_lock:
+        result = _ocr_cache.get(digest)
+        if result is not None:
+            _ocr_cache.move_to_end(digest)
+        return result
+
+def cache_ocr_result(digest, result):
+    """Remember a successful OCR result for an upload digest"""
+    if result['description'] == OCR_FAILED_DESCRIPTION:
+        return
+    with _ocr_cache_lock:
+        _ocr_cache[digest] = result
+        _ocr_cache.move_to_end(digest)
+        while len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+# Background receipt OCR (keeps tesseract off the request path)
+RECEIPT_BATCH_SIZE = 16
+RECEIPT_BATCH_WAIT = 0.5  # seconds to wait for more receipts before flushing a batch
+_receipt_queue = queue.Queue()
+_ocr_pool = ThreadPoolExecutor(max_workers=4)
+_receipt_worker = None
+_receipt_worker_lock = threading.Lock()
+
+def _collect_receipts():
+    """Group queued receipts into batches and hand them to the OCR pool"""
+    while True:
+        batch = [_receipt_queue.get()]
+        while len(batch) < RECEIPT_BATCH_SIZE:
+            try:
+                batch.append(_receipt_queue.get(timeout=RECEIPT_BATCH_WAIT))
+            except queue.Empty:
+                break
+        _ocr_pool.submit(_process_receipt_batch, batch).add_done_callback(_log_background_failure)
+
+def _log_background_failure(future):
+    """Log an exception raised by a background OCR task (nothing else waits on its future)"""
+    error = future.exception()
+    if error is not None:
+        app.logger.error('Background receipt OCR failed', exc_info=error)
+
+def _process_receipt_batch(batch):
+    """OCR a batch of (claim_id, file_path, digest) receipts and store the results"""
+    def _store_receipt_data(conn, rows):
+        # Claims leave 'processing' once their receipt is read, unless already decided
+        conn.executemany("""
+            UPDATE expense_claims 
+            SET receipt_data = ?,
+                status = CASE WHEN status = 'processing' THEN 'pending' ELSE status END
+            WHERE claim_id = ?
+        """, rows)
+
+    # Receipts already read (e.g. previewed through upload_receipt) skip OCR
+    results = {}
+    pending = []
+    for claim_id, file_path, digest in batch:
+        cached = get_cached_ocr(digest) if digest else None
+        if cached is not None:
+            results[claim_id] = cached
+        else:
+            pending.append((claim_id, file_path, digest))
+
+    if pending:
+        ocr_results = ocr_receipts_batch([file_path for _, file_path, _ in pending])
+        for (claim_id, _, digest), result in zip(pending, ocr_results):
+            results[claim_id] = result
+            if digest:
+                cache_ocr_result(digest, result)
+
+    rows = [(json.dumps(result), claim_id) for claim_id, result in results.items()]
+    execute_db_operation(_store_receipt_data, rows)
+
+def enqueue_receipt_ocr(claim_id, file_path, digest=None):
+    """Queue a receipt for background OCR"""
+    global _receipt_worker
+    with _receipt_worker_lock:
+        if _receipt_worker is None:
+            _receipt_worker = threading.Thread(target=_collect_receipts, daemon=True)
+            _receipt_worker.start()
+    _receipt_queue.put((claim_id, file_path, digest))
+
+# Receipts claimed longer ago than this are assumed orphaned (their process exited) and re-queued
+OCR_CLAIM_TIMEOUT = 300
+RECEIPT_SWEEP_INTERVAL = 60  # seconds between checks for orphaned receipts, per process
+_next_receipt_sweep = 0
+_receipt_sweep_lock = threading.Lock()
+
+@app.before_request
+def resume_receipt_ocr():
+    """Re-queue receipts left 'processing' by a process that exited before finishing them"""
+    global _next_receipt_sweep
+    if time.monotonic() < _next_receipt_sweep or not _receipt_sweep_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.time()
+        # Claim the orphaned rows under the write lock, so each is re-queued by only one worker
+        with database_transaction() as conn:
+            orphaned = conn.execute("""
+                SELECT claim_id, receipt_url FROM expense_claims 
+                WHERE status = 'processing' AND (ocr_claimed_at IS NULL OR ocr_claimed_at < ?)
+            """, (now - OCR_CLAIM_TIMEOUT,)).fetchall()
+            conn.executemany('UPDATE expense_claims SET ocr_claimed_at = ? WHERE claim_id = ?',
+                             [(now, claim['claim_id']) for claim in orphaned])
+        for claim in orphaned:
+            enqueue_receipt_ocr(claim['claim_id'], f"{_UPLOAD_DIR}/{claim['receipt_url']}")
+    except sqlite3.Error:
+        # Not worth failing the request over; the next sweep tries again
+        app.logger.exception('Failed to resume orphaned receipt OCR')
+    finally:
+        _next_receipt_sweep = time.monotonic() + RECEIPT_SWEEP_INTERVAL
+        _receipt_sweep_lock.release()
+
+# OCR jobs started by upload_receipt live in the ocr_jobs table, so a poll can land on any worker
+OCR_JOB_TTL = 600  # seconds a finished or abandoned job is kept for polling
+
+def _ocr_upload(job_id, image, digest):
+    """OCR an uploaded receipt (path or in-memory file), cache it and store the job result"""
+    result = ocr_receipt(image)
+    cache_ocr_result(digest, result)
+    with database_transaction() as conn:
+        conn.execute('UPDATE ocr_jobs SET result = ? WHERE job_id = ?', (json.dumps(result), job_id))
 
-        # Get first date found
-        expense_date = datetime.now().strftime('%Y-%m-%d')
-        if dates:
+def submit_ocr_job(user_id, image, digest):
+    """Start OCR of an uploaded receipt on the OCR pool and return its job id"""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with database_transaction() as conn:
+        conn.execute('DELETE FROM ocr_jobs WHERE created_at < ?', (now - OCR_JOB_TTL,))
+        conn.execute('INSERT INTO ocr_jobs (job_id, user_id, created_at) VALUES (?, ?, ?)',
+                     (job_id, user_id, now))
+    _ocr_pool.submit(_ocr_upload, job_id, image, digest).add_done_callback(_log_background_failure)
+    return job_id
+
+# Background audit logging (entries are batched into one transaction per flush)
+AUDIT_FLUSH_INTERVAL = 0.1  # seconds to collect entries before writing a batch
+AUDIT_BATCH_SIZE = 256
+_audit_queue = queue.SimpleQueue()
+_audit_writer = None
+_audit_writer_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _audit_insert_sql():
+    """Build the audit insert for this database's timestamp column (looked up once)"""
+    # Databases built from database_schema.sql call the column created_at
+    columns = {row[1] for row in db_manager.get_connection().execute('PRAGMA table_info(audit_log)')}
+    timestamp_column = 'timestamp' if 'timestamp' in columns else 'created_at'
+    return f"""
+        INSERT INTO audit_log (user_id, action, entity, entity_id, details, {timestamp_column})
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+
+def _write_audit_batch(entries):
+    """Insert a batch of queued audit entries (best-effort, retried once)"""
+    # Append-only inserts never conflict, so skip the transaction retry scaffolding
+    conn = db_manager.get_connection()
+    for _ in range(2):
+        try:
+            conn.executemany(_audit_insert_sql(), entries)
+            conn.commit()
+            return
+        except sqlite3.IntegrityError:
+            # A bad row (e.g. a stale session's deleted user) fails the whole batch;
+            # insert one by one so only that entry is dropped
+            conn.rollback()
             try:
-                # Try to parse the date
-                date_str = dates[0]
-                if '/' in date_str:
-                    expense_date = datetime.strptime(date_str, '%m/%d/%Y').strftime('%Y-%m-%d')
-                elif '-' in date_str:
-                    expense_date = datetime.strptime(date_str, '%m-%d-%Y').strftime('%Y-%m-%d')
-            except:
-                pass
-
-        return {
-            'amount': total_amount,
-            'date': expense_date,
-            'description': text[:200],  # First 200 chars as description
-            'raw_text': text
-        }
-    except Exception as e:
-        return {
-            'amount': 0,
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'description': 'OCR processing failed',
-            'raw_text': str(e)
-        }
+                _write_audit_entries_individually(conn, entries)
+                return
+            except sqlite3.Error as e:
+                conn.rollback()
+                error = e
+                break
+        except sqlite3.Error as e:
+            conn.rollback()
+            error = e
+            # Only operational errors (e.g. a lock timeout) are worth a second try
+            if not isinstance(e, sqlite3.OperationalError):
+                break
+    app.logger.error('Failed to write %d audit log entries', len(entries), exc_info=error)
+
+def _write_audit_entries_individually(conn, entries):
+    """Insert audit entries one at a time, logging and skipping any that are rejected"""
+    for entry in entries:
+        try:
+            conn.execute(_audit_insert_sql(), entry)
+        except sqlite3.IntegrityError:
+            app.logger.exception('Dropped audit log entry %r', entry)
+    conn.commit()
+
+def _run_audit_writer():
+    """Drain the audit queue, flushing every AUDIT_FLUSH_INTERVAL"""
+    while True:
+        entries = [_audit_queue.get()]
+        deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+        while len(entries) < AUDIT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entries.append(_audit_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_audit_batch(entries)
+
+def start_audit_writer():
+    """Start the background audit writer thread if it isn't running"""
+    global _audit_writer
+    with _audit_writer_lock:
+        if _audit_writer is None:
+            _audit_writer = threading.Thread(target=_run_audit_writer, daemon=True)
+            _audit_writer.start()
+
+@atexit.register
+def flush_audit_log():
+    """Write any audit entries still queued"""
+    entries = []
+    while True:
+        try:
+            entries.append(_audit_queue.get_nowait())
+        except queue.Empty:
+            break
+    if entries:
+        _write_audit_batch(entries)
+
+def create_user(conn, company_id, name, email, password_hash, role_type='employee', manager_id=None):
+    """Insert a user with an already-hashed password and return the new user_id"""
+    cursor = conn.execute("""
+        INSERT INTO users (company_id, name, email, password_hash, role_type, manager_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (company_id, name, email, password_hash, role_type, manager_id))
+    return cursor.lastrowid
+
+def is_duplicate_email(error):
+    """Check whether an IntegrityError came from the UNIQUE constraint on users.email"""
+    return 'users.email' in str(error)
+
+def hash_passwords_parallel(passwords):
+    """Hash several passwords at once (hashlib releases the GIL while hashing)"""
+    if len(passwords) <= 1:
+        return [generate_password_hash(password, method=PASSWORD_HASH_METHOD) for password in passwords]
+
+    with ThreadPoolExecutor(max_workers=min(len(passwords), os.cpu_count() or 1)) as executor:
+        return list(executor.map(
+            lambda password: generate_password_hash(password, method=PASSWORD_HASH_METHOD), passwords))
 
 def log_audit(user_id, action, entity, entity_id, details=''):
     """Log audit trail"""
-    def _log_audit(conn, user_id, action, entity, entity_id, details):
-        conn.execute("""
-            INSERT INTO audit_log (user_id, action, entity, entity_id, details)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, action, entity, entity_id, details))
-    
-    execute_db_operation(_log_audit, user_id, action, entity, entity_id, details)
+    start_audit_writer()
+    # Timestamp at call time so batching doesn't shift the recorded time (UTC, like CURRENT_TIMESTAMP)
+    timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    _audit_queue.put((user_id, action, entity, entity_id, details, timestamp))
 
 
 # Routes
@@ -409,61 +943,48 @@ def signup():
         country_code = request.form['country_code']
 
         # Get currency for selected country
-        base_currency = 'USD'  # Default
+        base_currency = get_country_currency_map().get(country_code, 'USD')
         countries = get_countries_currencies()
-        for country in countries:
-            if country.get('name', {}).get('common') == country_code:
-                currencies = country.get('currencies', {})
-                if currencies:
-                    base_currency = list(currencies.keys())[0]
-                break
 
         conn = get_db()
 
-        # Check if email already exists
-        existing_user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-        if existing_user:
-            flash('Email already registered', 'error')
-            return render_template('signup.html', countries=countries)
-
         # Check if company already exists
-        existing_company = conn.execute('SELECT * FROM companies WHERE name = ? AND country_code = ?', 
+        existing_company = conn.execute('SELECT company_id, base_currency FROM companies WHERE name = ? AND country_code = ?', 
                                       (company_name, country_code)).fetchone()
+        password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         
-        if existing_company:
-            # Company exists, add user as employee
-            company_id = existing_company['company_id']
-            base_currency = existing_company['base_currency']
-            role_type = 'employee'  # Default role for joining existing company
-            
-            password_hash = generate_password_hash(password)
-            cursor = conn.execute("""
-                INSERT INTO users (company_id, name, email, password_hash, role_type)
-                VALUES (?, ?, ?, ?, ?)
-            """, (company_id, name, email, password_hash, role_type))
-            user_id = cursor.lastrowid
-            
-            flash('Account created successfully! You have been added as an employee.', 'success')
-        else:
-            # Create new company
-            cursor = conn.execute("""
-                INSERT INTO companies (name, country_code, base_currency)
-                VALUES (?, ?, ?)
-            """, (company_name, country_code, base_currency))
-            company_id = cursor.lastrowid
-
-            # Create admin user (first user of the company)
-            password_hash = generate_password_hash(password)
-            role_type = 'admin'
-            cursor = conn.execute("""
-                INSERT INTO users (company_id, name, email, password_hash, role_type)
-                VALUES (?, ?, ?, ?, ?)
-            """, (company_id, name, email, password_hash, role_type))
-            user_id = cursor.lastrowid
-            
-            flash('Company and admin account created successfully!', 'success')
+        try:
+            if existing_company:
+                # Company exists, add user as employee
+                company_id = existing_company['company_id']
+                base_currency = existing_company['base_currency']
+                role_type = 'employee'  # Default role for joining existing company
+                user_id = create_user(conn, company_id, name, email, password_hash, role_type)
+                
+                flash_message = 'Account created successfully! You have been added as an employee.'
+            else:
+                # Create new company
+                cursor = conn.execute("""
+                    INSERT INTO companies (name, country_code, base_currency)
+                    VALUES (?, ?, ?)
+                """, (company_name, country_code, base_currency))
+                company_id = cursor.lastrowid
+
+                # Create admin user (first user of the company)
+                role_type = 'admin'
+                user_id = create_user(conn, company_id, name, email, password_hash, role_type)
+                
+                flash_message = 'Company and admin account created successfully!'
+        except sqlite3.IntegrityError as e:
+            # The UNIQUE constraint on users.email rejects already registered emails
+            conn.rollback()
+            if not is_duplicate_email(e):
+                raise
+            flash('Email already registered', 'error')
+            return render_template('signup.html', countries=countries)
 
         conn.commit()
+        flash(flash_message, 'success')
     
 
         # Log user in
@@ -499,13 +1020,22 @@ def login():
         """, (email,)).fetchone()
     
 
-        if user and check_password_hash(user['password_hash'], password):
+        # Unknown emails are checked against a dummy hash so they take as long as wrong passwords
+        password_hash = user['password_hash'] if user else _DUMMY_PASSWORD_HASH
+        if check_password_hash(password_hash, password) and user:
             session['user_id'] = user['user_id']
             session['company_id'] = user['company_id']
             session['name'] = user['name']
             session['role_type'] = user['role_type']
             session['base_currency'] = user['base_currency']
 
+            # Upgrade legacy (pbkdf2) hashes so every account ends up with scrypt timings
+            if not password_hash.startswith(f'{PASSWORD_HASH_METHOD}:'):
+                with database_transaction() as conn:
+                    conn.execute('UPDATE users SET password_hash = ? WHERE user_id = ?',
+                                 (generate_password_hash(password, method=PASSWORD_HASH_METHOD),
+                                  user['user_id']))
+
             log_audit(user['user_id'], 'LOGIN', 'USER', user['user_id'])
 
             flash('Login successful!', 'success')
@@ -528,27 +1058,40 @@ def logout():
 @login_required
 def dashboard():
     """Main dashboard"""
-    conn = get_db()
-
-    # Get user's expense statistics
-    user_stats = conn.execute("""
-        SELECT 
-            COUNT(*) as total_claims,
-            COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_claims,
-            COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved_claims,
-            COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected_claims,
-            COALESCE(SUM(CASE WHEN status = 'approved' THEN converted_amount ELSE 0 END), 0) as total_approved
-        FROM expense_claims 
-        WHERE user_id = ?
-    """, (session['user_id'],)).fetchone()
-
-    # Get recent expenses
-    recent_expenses = conn.execute("""
-        SELECT * FROM expense_claims 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC 
-        LIMIT 5
+    conn = get_db(readonly=True)
+
+    # Get user's expense statistics and recent expenses in one query:
+    # the first row carries the stats, the rest are the 5 most recent claims
+    rows = conn.execute("""
+        WITH mine AS (
+            SELECT claim_id, title, category, converted_amount, status, expense_date, created_at
+            FROM expense_claims 
+            WHERE user_id = ?
+        )
+        SELECT * FROM (
+            SELECT 
+                'stats' as kind,
+                COUNT(*) as total_claims,
+                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_claims,
+                COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved_claims,
+                COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected_claims,
+                COALESCE(SUM(CASE WHEN status = 'approved' THEN converted_amount ELSE 0 END), 0) as total_approved,
+                NULL as claim_id, NULL as title, NULL as category, NULL as converted_amount,
+                NULL as status, NULL as expense_date, NULL as created_at
+            FROM mine
+            UNION ALL
+            SELECT * FROM (
+                SELECT 'recent', NULL, NULL, NULL, NULL, NULL,
+                       claim_id, title, category, converted_amount, status, expense_date, created_at
+                FROM mine 
+                ORDER BY created_at DESC 
+                LIMIT 5
+            )
+        )
+        ORDER BY kind = 'recent', created_at DESC
     """, (session['user_id'],)).fetchall()
+    user_stats = rows[0]
+    recent_expenses = rows[1:]
 
     # Get pending approvals (for managers/admins)
     pending_approvals = []
@@ -584,40 +1127,46 @@ def submit_expense():
         # Handle file upload
         receipt_url = None
         receipt_data = None
+        file_path = None
+        receipt_digest = None
 
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename != '':
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
+                filename, file_path = upload_destination(file.filename)
+                receipt_digest, _ = save_upload(file, file_path)
                 receipt_url = filename
 
-                # Perform OCR on the receipt
-                ocr_data = ocr_receipt(file_path)
-                receipt_data = json.dumps(ocr_data)
-
         # Convert currency to company base currency
         base_currency = session['base_currency']
         converted_amount = convert_currency(amount, currency, base_currency)
 
+        # Claims with a receipt stay 'processing' until background OCR finishes
+        status = 'processing' if file_path else 'pending'
+
         # Create expense claim using thread-safe transaction
         with database_transaction() as conn:
             cursor = conn.execute("""
                 INSERT INTO expense_claims (user_id, company_id, title, category, description, 
                                           amount, currency, converted_amount, expense_date, 
-                                          receipt_url, receipt_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                          status, receipt_url, receipt_data, ocr_claimed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (session['user_id'], session['company_id'], title, category, description,
-                   amount, currency, converted_amount, expense_date, receipt_url, receipt_data))
+                   amount, currency, converted_amount, expense_date, status, receipt_url, receipt_data,
+                   time.time() if file_path else None))
 
             claim_id = cursor.lastrowid
 
-            # Create approval workflow
-            create_approval_workflow(claim_id, session['user_id'], session['company_id'])
-    
+            # Create approval workflow in the same transaction (one commit per request)
+            approver_count = create_approval_workflow(conn, claim_id, session['user_id'],
+                                                      session['company_id'])
+
+        log_audit(session['user_id'], 'CREATE', 'APPROVAL_WORKFLOW', claim_id,
+                  f'Created approval workflow with {approver_count} approvers')
+
+        # OCR the receipt in the background; receipt_data is filled in when it finishes
+        if file_path:
+            enqueue_receipt_ocr(claim_id, file_path, receipt_digest)
 
         log_audit(session['user_id'], 'CREATE', 'EXPENSE_CLAIM', claim_id, 
                  f'Expense claim created: {title}')
@@ -635,9 +1184,11 @@ def submit_expense():
 @login_required
 def my_expenses():
     """View user's expense claims"""
-    conn = get_db()
+    conn = get_db(readonly=True)
     expenses = conn.execute("""
-        SELECT * FROM expense_claims 
+        SELECT claim_id, title, category, description, amount, currency, converted_amount,
+               status, expense_date, receipt_url, created_at
+        FROM expense_claims 
         WHERE user_id = ? 
         ORDER BY created_at DESC
     """, (session['user_id'],)).fetchall()
@@ -645,6 +1196,24 @@ def my_expenses():
 
     return render_template('my_expenses.html', expenses=expenses)
 
+@app.route('/expense_status/<int:claim_id>')
+@login_required
+def expense_status(claim_id):
+    """Poll the status and OCR results of one of the user's expense claims"""
+    conn = get_db(readonly=True)
+    claim = conn.execute("""
+        SELECT status, receipt_data FROM expense_claims 
+        WHERE claim_id = ? AND user_id = ?
+    """, (claim_id, session['user_id'])).fetchone()
+
+    if not claim:
+        return jsonify({'error': 'Expense not found'}), 404
+
+    return jsonify({
+        'status': claim.status,
+        'receipt_data': json.loads(claim.receipt_data) if claim.receipt_data else None
+    })
+
 @app.route('/approvals')
 @login_required
 def approvals():
@@ -653,7 +1222,7 @@ def approvals():
         flash('Access denied', 'error')
         return redirect(url_for('dashboard'))
 
-    conn = get_db()
+    conn = get_db(readonly=True)
     pending_approvals = conn.execute("""
         SELECT ec.*, u.name as employee_name, a.sequence_order, a.approval_id
         FROM expense_claims ec
@@ -673,26 +1242,23 @@ def approve_expense(approval_id):
     decision = request.form['decision']
     comment = request.form.get('comment', '')
 
-    conn = get_db()
-
-    # Update approval
-    conn.execute("""
-        UPDATE approvals 
-        SET decision = ?, comment = ?, decided_at = CURRENT_TIMESTAMP
-        WHERE approval_id = ? AND approver_id = ?
-    """, (decision, comment, approval_id, session['user_id']))
-
-    # Get claim information
-    approval = conn.execute("""
-        SELECT * FROM approvals WHERE approval_id = ?
-    """, (approval_id,)).fetchone()
-
-    if approval:
-        # Check if this completes the approval process
-        process_approval_workflow(approval['claim_id'], decision)
+    # The decision and the resulting claim status commit together
+    with database_transaction() as conn:
+        # Update approval
+        conn.execute("""
+            UPDATE approvals 
+            SET decision = ?, comment = ?, decided_at = CURRENT_TIMESTAMP
+            WHERE approval_id = ? AND approver_id = ?
+        """, (decision, comment, approval_id, session['user_id']))
 
-    conn.commit()
+        # Get claim information
+        approval = conn.execute("""
+            SELECT * FROM approvals WHERE approval_id = ?
+        """, (approval_id,)).fetchone()
 
+        if approval:
+            # Check if this completes the approval process
+            process_approval_workflow(conn, approval['claim_id'], decision)
 
     log_audit(session['user_id'], decision.upper(), 'EXPENSE_APPROVAL', approval_id, comment)
 
@@ -703,19 +1269,21 @@ def approve_expense(approval_id):
 @admin_required
 def admin_panel():
     """Admin panel"""
-    conn = get_db()
+    conn = get_db(readonly=True)
 
-    # Get company statistics
+    # Get company statistics (claim totals in a single pass over expense_claims)
     stats = conn.execute("""
         SELECT 
             (SELECT COUNT(*) FROM users WHERE company_id = ? AND is_active = 1) as total_users,
-            (SELECT COUNT(*) FROM expense_claims WHERE company_id = ?) as total_claims,
-            (SELECT COALESCE(SUM(converted_amount), 0) FROM expense_claims WHERE company_id = ? AND status = 'approved') as total_approved_amount
-    """, (session['company_id'], session['company_id'], session['company_id'])).fetchone()
+            COUNT(*) as total_claims,
+            COALESCE(SUM(CASE WHEN status = 'approved' THEN converted_amount END), 0) as total_approved_amount
+        FROM expense_claims 
+        WHERE company_id = ?
+    """, (session['company_id'], session['company_id'])).fetchone()
 
     # Get recent activities
     activities = conn.execute("""
-        SELECT al.*, u.name as user_name
+        SELECT al.action, al.entity, al.details, al.timestamp, u.name as user_name
         FROM audit_log al
         JOIN users u ON al.user_id = u.user_id
         WHERE u.company_id = ?
@@ -731,7 +1299,7 @@ def admin_panel():
 @admin_required
 def manage_users():
     """Manage users"""
-    conn = get_db()
+    conn = get_db(readonly=True)
     users = conn.execute("""
         SELECT u.*, m.name as manager_name
         FROM users u
@@ -754,22 +1322,19 @@ def add_user():
         role_type = request.form['role_type']
         manager_id = request.form.get('manager_id') or None
 
+        # Hash before touching the database so the write lock isn't held while hashing
+        password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         conn = get_db()
 
-        # Check if email already exists
-        existing_user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-        if existing_user:
+        # Create user (the UNIQUE constraint on users.email rejects existing emails)
+        try:
+            user_id = create_user(conn, session['company_id'], name, email, password_hash, role_type, manager_id)
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            if not is_duplicate_email(e):
+                raise
             flash('Email already exists', 'error')
             return redirect(url_for('add_user'))
-
-        # Create user
-        password_hash = generate_password_hash(password)
-        cursor = conn.execute("""
-            INSERT INTO users (company_id, name, email, password_hash, role_type, manager_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (session['company_id'], name, email, password_hash, role_type, manager_id))
-
-        user_id = cursor.lastrowid
         conn.commit()
     
 
@@ -788,6 +1353,64 @@ def add_user():
 
     return render_template('add_user.html', managers=managers)
 
+# Larger imports would spend too long hashing passwords inside a single request
+MAX_BULK_USERS = 200
+
+@app.route('/bulk_add_users', methods=['POST'])
+@admin_required
+def bulk_add_users():
+    """Add users from an uploaded CSV (name,email,password[,role_type])"""
+    file = request.files.get('users_csv')
+    if not file or file.filename == '':
+        flash('No CSV file selected', 'error')
+        return redirect(url_for('manage_users'))
+
+    try:
+        reader = csv.DictReader(io.TextIOWrapper(file.stream, encoding='utf-8-sig'))
+        users = []
+        for row in reader:
+            if len(users) == MAX_BULK_USERS:
+                flash(f'CSV has too many users (at most {MAX_BULK_USERS} per import)', 'error')
+                return redirect(url_for('manage_users'))
+            role_type = (row.get('role_type') or 'employee').strip().lower()
+            if not row.get('name') or not row.get('email') or not row.get('password') \
+                    or role_type not in ('admin', 'manager', 'employee'):
+                flash(f'Invalid CSV row {reader.line_num}', 'error')
+                return redirect(url_for('manage_users'))
+            users.append((row['name'].strip(), row['email'].strip(), row['password'], role_type))
+    except (UnicodeDecodeError, csv.Error):
+        flash('Could not read CSV file', 'error')
+        return redirect(url_for('manage_users'))
+
+    # Hash outside the write transaction, in parallel
+    password_hashes = hash_passwords_parallel([password for _, _, password, _ in users])
+    rows = [(session['company_id'], name, email, password_hash, role_type)
+            for (name, email, _, role_type), password_hash in zip(users, password_hashes)]
+
+    def _insert_users(conn, rows):
+        created = []
+        for row in rows:
+            # Existing emails are skipped rather than failing the whole import
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO users (company_id, name, email, password_hash, role_type)
+                VALUES (?, ?, ?, ?, ?)
+            """, row)
+            if cursor.rowcount:
+                created.append((cursor.lastrowid, row[1], row[2]))
+        return created
+
+    created_users = execute_db_operation(_insert_users, rows)
+
+    # One entry per user, matching add_user
+    for user_id, name, email in created_users:
+        log_audit(session['user_id'], 'CREATE', 'USER', user_id, f'User created: {name} ({email})')
+
+    created = len(created_users)
+    skipped = len(rows) - created
+    flash(f'{created} users added successfully!' + (f' {skipped} skipped (email already exists).' if skipped else ''),
+          'success')
+    return redirect(url_for('manage_users'))
+
 @app.route('/edit_user/<int:user_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_user(user_id):
@@ -801,22 +1424,20 @@ def edit_user(user_id):
         manager_id = request.form.get('manager_id') or None
         is_active = 1 if request.form.get('is_active') else 0
         
-        # Check if email already exists for other users
-        existing_user = conn.execute("""
-            SELECT * FROM users WHERE email = ? AND user_id != ?
-        """, (email, user_id)).fetchone()
-        
-        if existing_user:
+        # Update user (the UNIQUE constraint on users.email rejects emails used by other users)
+        try:
+            conn.execute("""
+                UPDATE users 
+                SET name = ?, email = ?, role_type = ?, manager_id = ?, is_active = ?
+                WHERE user_id = ? AND company_id = ?
+            """, (name, email, role_type, manager_id, is_active, user_id, session['company_id']))
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            if not is_duplicate_email(e):
+                raise
             flash('Email already exists for another user', 'error')
             return redirect(url_for('edit_user', user_id=user_id))
         
-        # Update user
-        conn.execute("""
-            UPDATE users 
-            SET name = ?, email = ?, role_type = ?, manager_id = ?, is_active = ?
-            WHERE user_id = ? AND company_id = ?
-        """, (name, email, role_type, manager_id, is_active, user_id, session['company_id']))
-        
         conn.commit()
     
         
@@ -845,131 +1466,99 @@ def edit_user(user_id):
     
     return render_template('edit_user.html', user=user, managers=managers)
 
-def create_approval_workflow(claim_id, user_id, company_id):
-    """Create approval workflow for expense claim with robust fallback logic"""
-    def _create_workflow(conn, claim_id, user_id, company_id):
-        # Get user's manager
-        user = conn.execute('SELECT manager_id FROM users WHERE user_id = ?', (user_id,)).fetchone()
-
-        # Get approval sequences for the company
-        sequences = conn.execute("""
-            SELECT * FROM approval_sequences 
-            WHERE company_id = ? 
-            ORDER BY sequence_order
-        """, (company_id,)).fetchall()
-
-        approvers = []
-        current_sequence = 1
-
-        # Strategy 1: Add manager as first approver if exists
-        if user and user['manager_id']:
-            # Verify manager is active and has manager/admin role
-            manager = conn.execute("""
-                SELECT user_id, role_type FROM users 
-                WHERE user_id = ? AND is_active = 1 AND role_type IN ('manager', 'admin')
-            """, (user['manager_id'],)).fetchone()
-            
-            if manager:
-                approvers.append({
-                    'approver_id': manager['user_id'],
-                    'sequence_order': current_sequence
-                })
-                current_sequence += 1
-
-        # Strategy 2: Add sequence approvers
-        for seq in sequences:
-            if seq['is_manager_approver'] and user and user['manager_id']:
-                continue  # Skip if manager already added
-
-            # Verify sequence approver is active and has appropriate role
-            seq_approver = conn.execute("""
-                SELECT user_id FROM users 
-                WHERE user_id = ? AND is_active = 1 AND role_type IN ('manager', 'admin')
-            """, (seq['user_id'],)).fetchone()
-            
-            if seq_approver:
-                approvers.append({
-                    'approver_id': seq['user_id'],
-                    'sequence_order': current_sequence
-                })
-                current_sequence += 1
-
-        # Strategy 3: Fallback - if no approvers found, assign to company admins
-        if not approvers:
-            company_admins = conn.execute("""
-                SELECT user_id FROM users 
-                WHERE company_id = ? AND role_type = 'admin' AND is_active = 1 AND user_id != ?
-                ORDER BY user_id
-            """, (company_id, user_id)).fetchall()
-            
-            for admin in company_admins:
-                approvers.append({
-                    'approver_id': admin['user_id'],
-                    'sequence_order': current_sequence
-                })
-                current_sequence += 1
-
-        # Strategy 4: Last resort - if still no approvers, assign to any admin in the company
-        if not approvers:
-            any_admin = conn.execute("""
-                SELECT user_id FROM users 
-                WHERE company_id = ? AND role_type = 'admin' AND is_active = 1
-                ORDER BY user_id LIMIT 1
-            """, (company_id,)).fetchone()
-            
-            if any_admin:
-                approvers.append({
-                    'approver_id': any_admin['user_id'],
-                    'sequence_order': 1
-                })
-
-        # Create approval records
-        for approver in approvers:
-            conn.execute("""
-                INSERT INTO approvals (claim_id, approver_id, sequence_order)
-                VALUES (?, ?, ?)
-            """, (claim_id, approver['approver_id'], approver['sequence_order']))
-
-        return len(approvers)
-
-    # Execute the workflow creation
-    approver_count = execute_db_operation(_create_workflow, claim_id, user_id, company_id)
-    
-    # Log approval workflow creation (after successful transaction)
-    log_audit(user_id, 'CREATE', 'APPROVAL_WORKFLOW', claim_id, f'Created approval workflow with {approver_count} approvers')
-
-def process_approval_workflow(claim_id, decision):
-    """Process approval workflow logic"""
-    def _process_workflow(conn, claim_id, decision):
-        # Get all approvals for this claim
-        approvals = conn.execute("""
-            SELECT * FROM approvals 
-            WHERE claim_id = ? 
-            ORDER BY sequence_order
-        """, (claim_id,)).fetchall()
-
-        # Check if claim should be approved/rejected
-        if decision == 'rejected':
-            # If any approval is rejected, reject the entire claim
-            conn.execute("""
-                UPDATE expense_claims 
-                SET status = 'rejected' 
-                WHERE claim_id = ?
-            """, (claim_id,))
-        else:
-            # Check if all required approvals are complete
-            pending_approvals = [a for a in approvals if a['decision'] == 'pending']
-
-            if not pending_approvals:
-                # All approvals complete, approve the claim
-                conn.execute("""
-                    UPDATE expense_claims 
-                    SET status = 'approved' 
-                    WHERE claim_id = ?
-                """, (claim_id,))
-
-    # Execute the workflow processing
-    execute_db_operation(_process_workflow, claim_id, decision)
+@lru_cache(maxsize=1024)
+def get_company_sequences(company_id):
+    """Get a company's approval sequences (cached; sequences change rarely)
+
+    Call get_company_sequences.cache_clear() after changing approval_sequences.
+    """
+    # Plain tuples: callers unpack (user_id, sequence_order, is_manager_approver) by position
+    cursor = db_manager.get_reader().cursor()
+    cursor.row_factory = None
+    return tuple(cursor.execute("""
+        SELECT user_id, sequence_order, is_manager_approver FROM approval_sequences 
+        WHERE company_id = ? 
+        ORDER BY sequence_order
+    """, (company_id,)).fetchall())
+
+def create_approval_workflow(conn, claim_id, user_id, company_id):
+    """Create approval workflow for expense claim on the caller's connection; returns approver count"""
+    # Get approval sequences for the company
+    sequences = get_company_sequences(company_id)
+
+    # Strategy 1 + 2: the user's manager first, then the sequence approvers (skipping the
+    # manager-approver slots when the user has a manager), keeping only active managers/admins
+    candidates_sql = 'SELECT manager_id, 0, 0 FROM submitter'
+    params = [user_id]
+    if sequences:
+        candidates_sql += ' UNION ALL VALUES ' + ', '.join('(?, ?, ?)' for _ in sequences)
+        for order, (approver_id, _, is_manager_approver) in enumerate(sequences, 1):
+            params.extend((approver_id, order, is_manager_approver))
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    approver_ids = [approver_id for approver_id, in cursor.execute(f"""
+        WITH submitter AS (
+            SELECT manager_id FROM users WHERE user_id = ?
+        ),
+        candidates(user_id, ord, is_manager_approver) AS (
+            {candidates_sql}
+        )
+        SELECT c.user_id FROM candidates c
+        JOIN users u ON u.user_id = c.user_id
+        WHERE u.is_active = 1 AND u.role_type IN ('manager', 'admin')
+          AND NOT (c.is_manager_approver AND (SELECT manager_id FROM submitter) IS NOT NULL)
+        ORDER BY c.ord
+    """, params).fetchall()]
+
+    approvers = [{'approver_id': approver_id, 'sequence_order': order}
+                 for order, approver_id in enumerate(approver_ids, 1)]
+    current_sequence = len(approvers) + 1
+
+    # Strategy 3: Fallback - if no approvers found, assign to the other company admins,
+    # or as a last resort to the first admin in the company (the submitter themselves)
+    if not approvers:
+        company_admins = [admin_id for admin_id, in cursor.execute("""
+            SELECT user_id FROM users 
+            WHERE company_id = ? AND role_type = 'admin' AND is_active = 1
+            ORDER BY user_id
+        """, (company_id,)).fetchall()]
+        
+        other_admins = [admin_id for admin_id in company_admins if admin_id != user_id]
+        for admin_id in other_admins or company_admins[:1]:
+            approvers.append({
+                'approver_id': admin_id,
+                'sequence_order': current_sequence
+            })
+            current_sequence += 1
+
+    # Create approval records
+    rows = [(claim_id, approver['approver_id'], approver['sequence_order']) for approver in approvers]
+    conn.executemany("""
+        INSERT INTO approvals (claim_id, approver_id, sequence_order)
+        VALUES (?, ?, ?)
+    """, rows)
+
+    return len(approvers)
+
+def process_approval_workflow(conn, claim_id, decision):
+    """Process approval workflow logic on the caller's connection"""
+    # Check if claim should be approved/rejected
+    if decision == 'rejected':
+        # If any approval is rejected, reject the entire claim
+        conn.execute("""
+            UPDATE expense_claims 
+            SET status = 'rejected' 
+            WHERE claim_id = ?
+        """, (claim_id,))
+    else:
+        # Approve the claim once no approvals are pending (checked in the same statement)
+        conn.execute("""
+            UPDATE expense_claims 
+            SET status = 'approved' 
+            WHERE claim_id = ? AND NOT EXISTS (
+                SELECT 1 FROM approvals WHERE claim_id = ? AND decision = 'pending'
+            )
+        """, (claim_id, claim_id))
 
 @app.route('/upload_receipt', methods=['POST'])
 @login_required
@@ -983,19 +1572,47 @@ def upload_receipt():
         return jsonify({'error': 'No file selected'})
 
     if file:
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-
-        # Perform OCR
-        ocr_data = ocr_receipt(file_path)
-
+        filename, file_path = upload_destination(file.filename)
+        digest, contents = save_upload(file, file_path, keep_contents=True)
+
+        # Identical uploads reuse the earlier result right away
+        ocr_data = get_cached_ocr(digest)
+        if ocr_data is not None:
+            return jsonify({
+                'success': True,
+                'data': ocr_data,
+                'filename': filename
+            })
+
+        # Otherwise OCR in the background; the client polls /ocr_result/<job_id>
+        # Small receipts are handed over from memory, skipping a read of the file just written
+        image = io.BytesIO(contents) if contents is not None else file_path
+        job_id = submit_ocr_job(session['user_id'], image, digest)
         return jsonify({
             'success': True,
-            'data': ocr_data,
+            'job_id': job_id,
             'filename': filename
-        })
+        }), 202
 
     return jsonify({'error': 'Upload failed'})
+
+@app.route('/ocr_result/<job_id>')
+@login_required
+def ocr_result(job_id):
+    """Poll the result of a background receipt OCR job"""
+    conn = get_db(readonly=True)
+    job = conn.execute("""
+        SELECT user_id, result FROM ocr_jobs WHERE job_id = ?
+    """, (job_id,)).fetchone()
+
+    if not job or job.user_id != session['user_id']:
+        return jsonify({'error': 'OCR job not found'}), 404
+
+    if job.result is None:
+        return jsonify({'status': 'pending'})
+
+    return jsonify({
+        'status': 'done',
+        'success': True,
+        'data': json.loads(job.result)
+    })
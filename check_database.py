@@ -6,14 +6,54 @@ A simple script to check and display database contents
 
 import sqlite3
 import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Report queries, run concurrently by check_database()
+COMPANIES_QUERY = """
+    SELECT company_id, name, country_code, base_currency 
+    FROM companies ORDER BY company_id
+"""
+
+USERS_QUERY = """
+    SELECT u.user_id, u.name, u.email, u.role_type, u.is_active,
+           c.name as company_name, m.name as manager_name
+    FROM users u
+    LEFT JOIN companies c ON u.company_id = c.company_id
+    LEFT JOIN users m ON u.manager_id = m.user_id
+    ORDER BY u.user_id
+"""
+
+RECENT_EXPENSES_QUERY = """
+    SELECT ec.claim_id, ec.title, ec.amount, ec.currency, ec.status,
+           u.name as user_name, ec.created_at
+    FROM expense_claims ec
+    JOIN users u ON ec.user_id = u.user_id
+    ORDER BY ec.created_at DESC
+    LIMIT 5
+"""
+
+PENDING_APPROVALS_QUERY = """
+    SELECT a.approval_id, ec.title, ec.amount, ec.currency,
+           u1.name as employee_name, u2.name as approver_name,
+           a.sequence_order, ec.status
+    FROM approvals a
+    JOIN expense_claims ec ON a.claim_id = ec.claim_id
+    JOIN users u1 ON ec.user_id = u1.user_id
+    JOIN users u2 ON a.approver_id = u2.user_id
+    WHERE ec.status = 'pending'
+    ORDER BY a.approval_id
+"""
+
 def check_database():
     """Check database structure and contents"""
     db_path = 'database/expense_management.db'
     
-    # Check if database exists
-    if not os.path.exists(db_path):
+    # Check if database exists (one stat call also gives the size and mtime shown below)
+    try:
+        st = os.stat(db_path)
+    except FileNotFoundError:
         print("❌ Database not found!")
         print(f"Expected location: {os.path.abspath(db_path)}")
         return False
@@ -22,8 +62,8 @@ def check_database():
     print("         FINSIGHT DATABASE CHECKER")
     print("="*60)
     print(f"📍 Database: {db_path}")
-    print(f"📊 Size: {os.path.getsize(db_path):,} bytes")
-    print(f"🕐 Last Modified: {datetime.fromtimestamp(os.path.getmtime(db_path))}")
+    print(f"📊 Size: {st.st_size:,} bytes")
+    print(f"🕐 Last Modified: {datetime.fromtimestamp(st.st_mtime)}")
     
     try:
         # Connect to database
@@ -35,27 +75,46 @@ def check_database():
         print("DATABASE TABLES")
         print("="*40)
         
-        tables = conn.execute("""
-            SELECT name, sql FROM sqlite_master 
-            WHERE type='table' AND name NOT LIKE 'sqlite_%'
-            ORDER BY name
-        """).fetchall()
-        
-        for table in tables:
-            # Get row count
-            count = conn.execute(f"SELECT COUNT(*) as count FROM {table['name']}").fetchone()
-            print(f"📋 {table['name']:20} ({count['count']:3} records)")
+        # Read the schema listing once and bucket it by type
+        schema_objects = defaultdict(list)
+        for row in conn.execute("""
+            SELECT type, name FROM sqlite_master 
+            WHERE type IN ('table', 'view', 'index', 'trigger') AND name NOT LIKE 'sqlite_%'
+            ORDER BY type, name
+        """):
+            schema_objects[row['type']].append(row['name'])
+        
+        # Get all row counts in one query
+        table_names = schema_objects['table']
+        counts = {}
+        if table_names:
+            count_sql = " UNION ALL ".join(
+                f"SELECT '{name}' AS name, COUNT(*) AS count FROM \"{name}\"" for name in table_names
+            )
+            counts = {row['name']: row['count'] for row in conn.execute(count_sql)}
+        
+        for name in table_names:
+            print(f"📋 {name:20} ({counts[name]:3} records)")
+        
+        # Run the report queries concurrently, each on its own read-only connection
+        # (SQLite in WAL mode serves parallel readers, and queries release the GIL)
+        def run_query(sql):
+            reader = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+            reader.row_factory = sqlite3.Row
+            try:
+                return reader.execute(sql).fetchall()
+            finally:
+                reader.close()
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            companies, users, expenses, pending = executor.map(
+                run_query, [COMPANIES_QUERY, USERS_QUERY, RECENT_EXPENSES_QUERY, PENDING_APPROVALS_QUERY])
         
         # Show company information
         print("\n" + "="*40)
         print("COMPANIES")
         print("="*40)
         
-        companies = conn.execute("""
-            SELECT company_id, name, country_code, base_currency 
-            FROM companies ORDER BY company_id
-        """).fetchall()
-        
         if companies:
             for c in companies:
                 print(f"🏢 [{c['company_id']:2}] {c['name']:<20} | {c['country_code']} | {c['base_currency']}")
@@ -67,15 +126,6 @@ def check_database():
         print("USERS")
         print("="*40)
         
-        users = conn.execute("""
-            SELECT u.user_id, u.name, u.email, u.role_type, u.is_active,
-                   c.name as company_name, m.name as manager_name
-            FROM users u
-            LEFT JOIN companies c ON u.company_id = c.company_id
-            LEFT JOIN users m ON u.manager_id = m.user_id
-            ORDER BY u.user_id
-        """).fetchall()
-        
         if users:
             for u in users:
                 status = "✅" if u['is_active'] else "❌"
@@ -89,15 +139,6 @@ def check_database():
         print("RECENT EXPENSES (Last 5)")
         print("="*40)
         
-        expenses = conn.execute("""
-            SELECT ec.claim_id, ec.title, ec.amount, ec.currency, ec.status,
-                   u.name as user_name, ec.created_at
-            FROM expense_claims ec
-            JOIN users u ON ec.user_id = u.user_id
-            ORDER BY ec.created_at DESC
-            LIMIT 5
-        """).fetchall()
-        
         if expenses:
             for e in expenses:
                 status_emoji = {"pending": "⏳", "approved": "✅", "rejected": "❌"}.get(e['status'], "❓")
@@ -110,18 +151,6 @@ def check_database():
         print("PENDING APPROVALS")
         print("="*40)
         
-        pending = conn.execute("""
-            SELECT a.approval_id, ec.title, ec.amount, ec.currency,
-                   u1.name as employee_name, u2.name as approver_name,
-                   a.sequence_order, ec.status
-            FROM approvals a
-            JOIN expense_claims ec ON a.claim_id = ec.claim_id
-            JOIN users u1 ON ec.user_id = u1.user_id
-            JOIN users u2 ON a.approver_id = u2.user_id
-            WHERE ec.status = 'pending'
-            ORDER BY a.approval_id
-        """).fetchall()
-        
         if pending:
             for p in pending:
                 print(f"⏳ {p['title']:<20} | ${p['amount']:>8} {p['currency']} | {p['employee_name']} → {p['approver_name']}")
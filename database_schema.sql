@@ -56,7 +56,8 @@ CREATE TABLE IF NOT EXISTS expense_claims (
     expense_date DATE NOT NULL,
     receipt_url TEXT,
     receipt_data TEXT, -- JSON data from OCR processing
-    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'approved', 'rejected')),
+    ocr_claimed_at REAL, -- when a worker last took the receipt for background OCR
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'approved', 'rejected', 'processing')),
     rejection_reason TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -131,6 +132,7 @@ CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_company ON users(company_id);
 CREATE INDEX IF NOT EXISTS idx_users_manager ON users(manager_id);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role_type);
+CREATE INDEX IF NOT EXISTS idx_users_company_role ON users(company_id, role_type, is_active);
 
 -- Expense claims indexes
 CREATE INDEX IF NOT EXISTS idx_expense_claims_user ON expense_claims(user_id);
@@ -142,7 +144,9 @@ CREATE INDEX IF NOT EXISTS idx_expense_claims_created ON expense_claims(created_
 -- Approvals indexes
 CREATE INDEX IF NOT EXISTS idx_approvals_claim ON approvals(claim_id);
 CREATE INDEX IF NOT EXISTS idx_approvals_approver ON approvals(approver_id);
+CREATE INDEX IF NOT EXISTS idx_approvals_approver_status ON approvals(approver_id, status);
 CREATE INDEX IF NOT EXISTS idx_approvals_status ON approvals(status);
+CREATE INDEX IF NOT EXISTS idx_approvals_claim_status ON approvals(claim_id, status);
 
 -- Approval sequences indexes
 CREATE INDEX IF NOT EXISTS idx_approval_sequences_company ON approval_sequences(company_id);
@@ -150,6 +154,7 @@ CREATE INDEX IF NOT EXISTS idx_approval_sequences_user ON approval_sequences(use
 
 -- Audit log indexes
 CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log(user_id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_user_created ON audit_log(user_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(entity, entity_id);
 CREATE INDEX IF NOT EXISTS idx_audit_log_created ON audit_log(created_at);
 
@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for running FinSight in production
+
+Usage: gunicorn -c gunicorn_conf.py app:app
+(run.py does this automatically unless FLASK_ENV=development)
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('FINSIGHT_BIND', '0.0.0.0:5000')
+
+# Several processes so requests aren't serialized behind the GIL or a slow handler
+workers = int(os.getenv('FINSIGHT_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers: SQLite calls and OCR block in C code and would stall a gevent hub,
+# while real threads release the GIL there and keep serving other requests
+worker_class = 'gthread'
+threads = int(os.getenv('FINSIGHT_THREADS', 4))
+
+# Receipt OCR runs in the background, so requests themselves stay short
+timeout = 60
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
@@ -5,10 +5,15 @@ FinSight Startup Script
 This script initializes and runs the FinSight Flask application.
 """
 
+import importlib.util
 import os
 import sys
+from flask.cli import load_dotenv
 from app import app, init_db
 
+# Pick up FLASK_ENV and friends from .env
+load_dotenv()
+
 def setup_environment():
     """Setup the environment for the application"""
     # Create necessary directories
@@ -31,8 +36,19 @@ if __name__ == '__main__':
     print("Access the application at: http://localhost:5000")
     print("Press Ctrl+C to stop the server")
 
-    try:
-        app.run(debug=True, host='0.0.0.0', port=5000)
-    except KeyboardInterrupt:
-        print("\nServer stopped by user")
-        sys.exit(0)
+    # The Flask development server handles one request at a time; keep it for local debugging,
+    # and on Windows, where gunicorn doesn't run
+    development = os.getenv('FLASK_ENV') == 'development'
+    if development or os.name == 'nt':
+        try:
+            app.run(debug=development, host='0.0.0.0', port=5000)
+        except KeyboardInterrupt:
+            print("\nServer stopped by user")
+            sys.exit(0)
+    else:
+        if importlib.util.find_spec('gunicorn') is None:
+            print("gunicorn not found. Install it (pip install gunicorn) or set FLASK_ENV=development")
+            sys.exit(1)
+        # Replace this process with gunicorn (run by this same interpreter, so an unactivated
+        # venv works) so workers start without the setup's threads/connections
+        os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py', 'app:app'])
@@ -7,6 +7,7 @@ Creates a new database from the schema file with optional sample data
 import sqlite3
 import os
 import sys
+from collections import defaultdict
 from datetime import datetime
 
 def create_database_from_schema(schema_file='database_schema.sql', db_file='database/expense_management.db'):
@@ -55,37 +56,48 @@ def create_database_from_schema(schema_file='database_schema.sql', db_file='data
         conn.row_factory = sqlite3.Row
         
         # Execute schema
+        # A fresh file has nothing to protect, so skip journaling and fsyncs during the load
         print("🏗️  Creating database structure...")
+        conn.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA locking_mode = EXCLUSIVE;
+        """)
         conn.executescript(schema_sql)
+        # Restore the normal durability and locking settings for the app
+        conn.executescript("""
+            PRAGMA locking_mode = NORMAL;
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+        """)
+        
+        # Read the whole schema listing once and bucket it by type
+        schema_objects = defaultdict(list)
+        for row in conn.execute("""
+            SELECT type, name FROM sqlite_master 
+            WHERE type IN ('table', 'view', 'index', 'trigger') AND name NOT LIKE 'sqlite_%'
+            ORDER BY type, name
+        """):
+            schema_objects[row['type']].append(row['name'])
         
         # Verify tables were created
-        tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+        tables = schema_objects['table']
         print(f"✅ Created {len(tables)} tables:")
-        for table in tables:
-            if not table['name'].startswith('sqlite_'):
-                count = conn.execute(f"SELECT COUNT(*) as count FROM {table['name']}").fetchone()
-                print(f"   - {table['name']} ({count['count']} records)")
-        
-        # Check views
-        views = conn.execute("SELECT name FROM sqlite_master WHERE type='view'").fetchall()
-        if views:
-            print(f"✅ Created {len(views)} views:")
-            for view in views:
-                print(f"   - {view['name']}")
-        
-        # Check indexes
-        indexes = conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%'").fetchall()
-        if indexes:
-            print(f"✅ Created {len(indexes)} indexes:")
-            for index in indexes:
-                print(f"   - {index['name']}")
-        
-        # Check triggers
-        triggers = conn.execute("SELECT name FROM sqlite_master WHERE type='trigger'").fetchall()
-        if triggers:
-            print(f"✅ Created {len(triggers)} triggers:")
-            for trigger in triggers:
-                print(f"   - {trigger['name']}")
+        if tables:
+            # Get all row counts in one query
+            count_sql = " UNION ALL ".join(
+                f"SELECT '{name}' AS name, COUNT(*) AS count FROM \"{name}\"" for name in tables
+            )
+            for row in conn.execute(count_sql):
+                print(f"   - {row['name']} ({row['count']} records)")
+        
+        # Check views, indexes and triggers
+        for object_type, label in (('view', 'views'), ('index', 'indexes'), ('trigger', 'triggers')):
+            names = schema_objects[object_type]
+            if names:
+                print(f"✅ Created {len(names)} {label}:")
+                for name in names:
+                    print(f"   - {name}")
         
         conn.close()
         
@@ -100,7 +112,7 @@ def create_database_from_schema(schema_file='database_schema.sql', db_file='data
         print("3. Start using the expense management system")
         print()
         print(f"Database location: {os.path.abspath(db_file)}")
-        print(f"Database size: {os.path.getsize(db_file):,} bytes")
+        print(f"Database size: {os.stat(db_file).st_size:,} bytes")
         
         return True
         
@@ -119,49 +131,44 @@ def add_sample_data(db_file='database/expense_management.db'):
         conn = sqlite3.connect(db_file)
         conn.row_factory = sqlite3.Row
         
-        # Sample company
-        conn.execute("""
-            INSERT OR IGNORE INTO companies (company_id, name, country_code, base_currency, email) 
-            VALUES (1, 'Demo Company Ltd.', 'US', 'USD', 'admin@democompany.com')
-        """)
-        
-        # Sample admin user (password: admin123)
-        conn.execute("""
-            INSERT OR IGNORE INTO users (user_id, company_id, name, email, password_hash, role_type) 
-            VALUES (1, 1, 'Admin Demo', 'admin@democompany.com', 
-                   'pbkdf2:sha256:600000$6yH7vQ2C8pDf2QFN$8c5a3f4c2b1d6e9f8a7b4c3d2e1f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f0', 
-                   'admin')
-        """)
-        
-        # Sample manager user (password: manager123)
-        conn.execute("""
-            INSERT OR IGNORE INTO users (user_id, company_id, name, email, password_hash, role_type) 
-            VALUES (2, 1, 'Manager Demo', 'manager@democompany.com', 
-                   'pbkdf2:sha256:600000$7zI8wR3D9qEg3RNA$9d6b4f5c3c2e7f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f0a9b8c7d6e5f4a3b2c1d', 
-                   'manager')
-        """)
-        
-        # Sample employee user (password: employee123)
-        conn.execute("""
-            INSERT OR IGNORE INTO users (user_id, company_id, name, email, password_hash, role_type, manager_id) 
-            VALUES (3, 1, 'Employee Demo', 'employee@democompany.com', 
-                   'pbkdf2:sha256:600000$8aJ9xS4E0rFh4SOB$ae7c5f6d4d3f8a1b0c9d8e7f6a5b4c3d2e1f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f', 
-                   'employee', 2)
-        """)
-        
-        # Sample approval sequence
-        conn.execute("""
-            INSERT OR IGNORE INTO approval_sequences (company_id, user_id, sequence_order, is_manager_approver) 
-            VALUES (1, 2, 1, 1)
-        """)
-        
-        # Sample approval rule
-        conn.execute("""
-            INSERT OR IGNORE INTO approval_rules (company_id, category, max_amount, requires_receipt, approval_levels) 
-            VALUES (1, 'Travel', 1000.00, 1, 1)
-        """)
+        # All sample rows go in as one explicit transaction (one commit, rolled back on error)
+        with conn:
+            # Sample company
+            conn.execute("""
+                INSERT OR IGNORE INTO companies (company_id, name, country_code, base_currency, email) 
+                VALUES (1, 'Demo Company Ltd.', 'US', 'USD', 'admin@democompany.com')
+            """)
+        
+            # Sample admin, manager and employee users
+            # (passwords: admin123, manager123, employee123)
+            sample_users = [
+                (1, 1, 'Admin Demo', 'admin@democompany.com',
+                 'pbkdf2:sha256:600000$6yH7vQ2C8pDf2QFN$8c5a3f4c2b1d6e9f8a7b4c3d2e1f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f0',
+                 'admin', None),
+                (2, 1, 'Manager Demo', 'manager@democompany.com',
+                 'pbkdf2:sha256:600000$7zI8wR3D9qEg3RNA$9d6b4f5c3c2e7f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f0a9b8c7d6e5f4a3b2c1d',
+                 'manager', None),
+                (3, 1, 'Employee Demo', 'employee@democompany.com',
+                 'pbkdf2:sha256:600000$8aJ9xS4E0rFh4SOB$ae7c5f6d4d3f8a1b0c9d8e7f6a5b4c3d2e1f0a9b8c7d6e5f4a3b2c1d0e9f8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f',
+                 'employee', 2),
+            ]
+            conn.executemany("""
+                INSERT OR IGNORE INTO users (user_id, company_id, name, email, password_hash, role_type, manager_id) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, sample_users)
+        
+            # Sample approval sequence
+            conn.execute("""
+                INSERT OR IGNORE INTO approval_sequences (company_id, user_id, sequence_order, is_manager_approver) 
+                VALUES (1, 2, 1, 1)
+            """)
+        
+            # Sample approval rule
+            conn.execute("""
+                INSERT OR IGNORE INTO approval_rules (company_id, category, max_amount, requires_receipt, approval_levels) 
+                VALUES (1, 'Travel', 1000.00, 1, 1)
+            """)
         
-        conn.commit()
         conn.close()
         
         print("✅ Sample data added successfully!")
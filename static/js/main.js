@@ -170,15 +170,46 @@ function showNotification(message, type = 'info') {
 }
 
 // OCR Processing Functions
-function processReceipt(file, callback) {
+
+// Poll a background OCR job until it finishes; resolves with the same shape as an inline result
+function waitForOcrResult(jobId, interval = 1000, maxAttempts = 60) {
+    return new Promise(function(resolve, reject) {
+        let attempts = 0;
+
+        function poll() {
+            fetch(`/ocr_result/${jobId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'pending') {
+                    resolve(data);
+                } else if (++attempts < maxAttempts) {
+                    setTimeout(poll, interval);
+                } else {
+                    resolve({ error: 'OCR processing timed out' });
+                }
+            })
+            .catch(reject);
+        }
+
+        poll();
+    });
+}
+
+// Upload a receipt and resolve with its OCR result, waiting on the background job if needed
+function uploadReceiptForOcr(file) {
     const formData = new FormData();
     formData.append('receipt', file);
 
-    fetch('/upload_receipt', {
+    return fetch('/upload_receipt', {
         method: 'POST',
         body: formData
     })
     .then(response => response.json())
+    .then(data => data.job_id ? waitForOcrResult(data.job_id) : data);
+}
+
+function processReceipt(file, callback) {
+    uploadReceiptForOcr(file)
     .then(data => {
         if (data.success) {
             callback(null, data.data);